@@ -4,9 +4,17 @@ import traceback
 from discord.ext import commands
 from dotenv import load_dotenv
 from discord.ext.commands import ExtensionError
+from db import init_db
+from leaderboards import LeaderboardCache
+from members import MemberResolver
+from outbound import OutboundScheduler
+from settings import SettingsStore
 
 load_dotenv()
 
+# Lean cache mode keeps no members in memory and resolves them on demand instead
+LEAN_MEMBER_CACHE = os.getenv("LEAN_MEMBER_CACHE", "true").lower() in ("1", "true", "yes")
+
 # Set up intents
 intents = discord.Intents.default()
 intents.members = True
@@ -31,15 +39,38 @@ async def cog_loader(bot_instance: commands.Bot) -> None:
 class ReactionLogger(commands.Bot):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.member_resolver = MemberResolver()
+        self.leaderboard_cache = LeaderboardCache()
+        self.outbound = OutboundScheduler()
+        self.settings = SettingsStore()
 
     async def on_ready(self):
         print(f"Logged in as {self.user.name}")
         print("Ready to log all reactions!")
 
     async def setup_hook(self):
+        await init_db()
+        await self.settings.seed_defaults()
+        await self.settings.load()
         await cog_loader(self)
 
-bot = ReactionLogger(command_prefix="uwu ", intents=intents, message_cache_size=1000)
+    async def close(self):
+        await self.outbound.close()
+        await super().close()
+
+    async def on_member_join(self, member: discord.Member):
+        self.member_resolver.forget(member.guild.id, member.id)
+
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # The non-raw event only fires for cached members, which lean mode has none of
+        self.member_resolver.forget(payload.guild_id, payload.user.id)
+
+if LEAN_MEMBER_CACHE:
+    bot = ReactionLogger(command_prefix="uwu ", intents=intents, message_cache_size=1000,
+                         member_cache_flags=discord.MemberCacheFlags.none(),
+                         chunk_guilds_at_startup=False)
+else:
+    bot = ReactionLogger(command_prefix="uwu ", intents=intents, message_cache_size=1000)
 
 if __name__ == "__main__":
     bot.run(os.getenv("TOKEN"))
@@ -1,5 +1,6 @@
 import re
-import os
+import time
+import asyncio
 import discord
 
 from collections import defaultdict
@@ -7,11 +8,18 @@ from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from discord import app_commands, Guild
 from discord.ext import commands
+from duplicates import DuplicateIndex, normalize
+from outbound import MODERATION
 
 load_dotenv()
 MESSAGE_THRESHOLD = 5 # number of messages
 TIME_WINDOW = 10 # in seconds
 MUTE_COOLDOWN = 10 # in minutes
+DUPLICATE_AUTHORS = 3 # distinct fresh accounts posting the same content
+DUPLICATE_FRESH_DAYS = 7 # accounts created or members joined within this many days count as fresh
+DUPLICATE_WINDOW = 30 # in seconds
+DUPLICATE_MAX_ENTRIES = 2000 # fingerprints kept per guild
+DUPLICATE_MIN_LENGTH = 20 # shorter normalized messages are too generic to compare
 
 message_cache = defaultdict(list)
 warned_users = {}
@@ -21,32 +29,107 @@ class AntiRaid(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.name_regex = "^(?![._])(?!.*[._]$)(?!.*[._]{2,})(?!.*[._]\d+)(?!.*\d+[._])([a-zA-Z]+([._][a-zA-Z]+)*)$"
-        self.guild = None
-        self.muted_channel = None
-        self.muted_role = None
-        self.moderator_role = None
-
-    async def initialize(self):
-        self.guild: discord.Guild = await self.bot.fetch_guild(int(os.getenv("GUILD_ID")))
-        self.muted_channel: discord.TextChannel = await self.guild.fetch_channel(int(os.getenv("MUTED_CHANNEL_ID")))
-        self.muted_role: discord.Role = self.guild.get_role(int(os.getenv("MUTED_ROLE_ID")))
+        self.duplicate_indexes = {}  # guild_id -> DuplicateIndex of recent messages
+        self.mitigations = set()  # Running mitigation tasks, referenced so they are not garbage collected
 
+    def moderator_ping(self, guild: discord.Guild) -> str:
+        moderator_role_id = self.bot.settings.get(guild.id, 'moderator_role_id')
+        return f"<@&{moderator_role_id}>" if moderator_role_id else "moderator"
 
     async def automute(self, member: discord.Member, reason: str):
-        await member.add_roles(self.muted_role)
-        await self.muted_channel.send(f"Hi there {member.mention}! You have been muted for {reason}")
+        settings = self.bot.settings.for_guild(member.guild.id)
+        muted_role = member.guild.get_role(settings.get('muted_role_id'))
+        if muted_role is None:  # Anti-raid is not configured for this guild
+            return
+        await member.add_roles(muted_role)
+        muted_channel = member.guild.get_channel(settings.get('muted_channel_id'))
+        self.bot.outbound.send(muted_channel, MODERATION, f"Hi there {member.mention}! You have been muted for {reason}")
+
+
+    def check_duplicates(self, message: discord.Message) -> bool:
+        """
+        Fingerprint messages from fresh accounts and start mitigation in the background once
+        DUPLICATE_AUTHORS distinct fresh accounts have posted the same or near identical content.
+        Established members are never counted, so ordinary chat posting the same text is left alone.
+        """
+        if self.bot.settings.get(message.guild.id, 'muted_role_id') is None: # Anti-raid is not configured
+            return False
+        if not self.is_fresh(message.author):
+            return False
+        text = normalize(message.content)
+        if len(text) < DUPLICATE_MIN_LENGTH:
+            return False
+
+        index = self.duplicate_indexes.get(message.guild.id)
+        if index is None:
+            index = self.duplicate_indexes[message.guild.id] = DuplicateIndex(DUPLICATE_WINDOW, DUPLICATE_MAX_ENTRIES)
+        matches, fingerprint = index.add(time.monotonic(), message.author.id, message.channel.id, message.id, text)
+
+        authors = {fingerprint.author_id} | {entry.author_id for entry in matches}
+        if len(authors) < DUPLICATE_AUTHORS:
+            return False
+
+        pending = [fingerprint] + [entry for entry in matches if not entry.handled]
+        for entry in pending:
+            entry.handled = True
+        task = asyncio.create_task(self.mitigate_duplicates(message.guild, pending))
+        self.mitigations.add(task)
+        task.add_done_callback(self.mitigations.discard)
+        return True
+
+    @staticmethod
+    def is_fresh(member: discord.Member) -> bool:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=DUPLICATE_FRESH_DAYS)
+        return member.created_at > cutoff or (member.joined_at is not None and member.joined_at > cutoff)
+
+    async def mitigate_duplicates(self, guild: discord.Guild, entries):
+        by_channel = defaultdict(list)
+        for entry in entries:
+            by_channel[entry.channel_id].append(entry.message_id)
+
+        for channel_id, message_ids in by_channel.items():
+            channel = guild.get_channel_or_thread(channel_id)
+            if channel is None:
+                continue
+            messages = [channel.get_partial_message(message_id) for message_id in message_ids]
+            for start in range(0, len(messages), 100): # Bulk deletes take at most 100 messages
+                batch = messages[start:start + 100]
+                try:
+                    if len(batch) == 1:
+                        await batch[0].delete()
+                    else:
+                        await channel.delete_messages(batch, reason="duplicate content spam")
+                except discord.HTTPException:
+                    pass  # Already deleted
+
+        now = datetime.now(timezone.utc)
+        members = await self.bot.member_resolver.resolve_many(guild, list({entry.author_id for entry in entries}))
+        for author_id, member in members.items():
+            cache_key = (guild.id, author_id)
+            if member is None:
+                continue
+            if cache_key in cooldown_cache and now - cooldown_cache[cache_key] < timedelta(minutes=MUTE_COOLDOWN):
+                continue
+            cooldown_cache[cache_key] = now
+            try:
+                await self.automute(member,
+                                    reason="posting the same message as several other new accounts.\n"
+                                        f"{self.moderator_ping(guild)}")
+            except discord.HTTPException as e: # One failed mute must not spare the rest of the raid
+                print(f"Failed to mute {author_id} in guild {guild.id}: {e}")
 
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         time_dif: timedelta = datetime.now(timezone.utc) - member.created_at
         emoji = "<:Unusual_Account_Activity:1223677920065749043>"
+        moderator = self.moderator_ping(member.guild)
         if not member.avatar:
             await self.automute(member,
                                 reason="having a default avatar. "
                                     "Although this by itself is not suspicious, "
                                     "we do get a lot of spammer accounts with no pfp, "
-                                    f"this is just a precaution, a <@&{int(os.getenv('MODERATOR_ROLE_ID'))}> "
+                                    f"this is just a precaution, a {moderator} "
                                     f"will be here soon to manually check.")
 
         elif not re.search(self.name_regex, member.name):
@@ -55,7 +138,7 @@ class AntiRaid(commands.Cog):
                                     "Your name is in a common format used by many "
                                     "scammers and spammers. You are not being accused of anything, "
                                     "this is just a precaution to preserve the safety of our server, "
-                                    f"a <@&{int(os.getenv('MODERATOR_ROLE_ID'))}> will be here soon to "
+                                    f"a {moderator} will be here soon to "
                                     f"manually check.")
 
         elif time_dif.days < 7:
@@ -63,7 +146,7 @@ class AntiRaid(commands.Cog):
                                 reason="having a too new account. "
                                     "You are not being accused of anything, "
                                     "this is just a precaution to preserve the safety of our server, "
-                                    f"a <@&{int(os.getenv('MODERATOR_ROLE_ID'))}> will be here soon to "
+                                    f"a {moderator} will be here soon to "
                                     "manually check.")
 
         elif discord.PublicUserFlags.spammer in member.public_flags:
@@ -72,7 +155,7 @@ class AntiRaid(commands.Cog):
                                     "Discord has flagged your account as possibly being a spam account, "
                                     f"commonly represented by this image {emoji}, please answer as to why "
                                     "within a few hours or you may be kicked, please ping a "
-                                    f"<@&{int(os.getenv('MODERATOR_ROLE_ID'))}> and one will be "
+                                    f"{moderator} and one will be "
                                     "here shortly")
 
 
@@ -85,51 +168,55 @@ class AntiRaid(commands.Cog):
             return
         elif isinstance(message.author, discord.Member) and message.author.bot: # If the member is a bot
             return
-        if self.moderator_role in message.author.roles: # If a member is a moderator
+        if isinstance(message.channel, discord.DMChannel): # Dms
             return
-        if message.channel.category_id == 958386788085407794: # Admin chats
+        settings = self.bot.settings.for_guild(message.guild.id)
+        moderator_role_id = settings.get('moderator_role_id')
+        if moderator_role_id and message.author.get_role(moderator_role_id): # If a member is a moderator
             return
-        if isinstance(message.channel, discord.DMChannel): # Dms
+        if message.channel.category_id == settings.get('admin_category_id'): # Admin chats
+            return
+        if self.check_duplicates(message): # Coordinated spam, already being dealt with
             return
 
         now = datetime.now(timezone.utc)
-        user_id = message.author.id
+        cache_key = (message.guild.id, message.author.id)
 
-        if user_id not in message_cache:
-            message_cache[user_id] = []
-        message_cache[user_id].append(now)
+        if cache_key not in message_cache:
+            message_cache[cache_key] = []
+        message_cache[cache_key].append(now)
 
-        message_cache[user_id] = [
-            timestamp for timestamp in message_cache[user_id]
+        message_cache[cache_key] = [
+            timestamp for timestamp in message_cache[cache_key]
             if now - timestamp < timedelta(seconds=TIME_WINDOW)
         ]
 
-        if len(message_cache[user_id]) >= MESSAGE_THRESHOLD:
-            if user_id in cooldown_cache and now - cooldown_cache[user_id] < timedelta(minutes=MUTE_COOLDOWN):
+        if len(message_cache[cache_key]) >= MESSAGE_THRESHOLD:
+            if cache_key in cooldown_cache and now - cooldown_cache[cache_key] < timedelta(minutes=MUTE_COOLDOWN):
                 return
 
-            if user_id not in warned_users:
-                warned_users[user_id] = True
-                await message.channel.send(
+            if cache_key not in warned_users:
+                warned_users[cache_key] = True
+                self.bot.outbound.send(
+                    message.channel,
+                    MODERATION,
                     f"{message.author.mention} you are spamming. "
                     f"Please slow down or you will be muted.")
                 await message.author.timeout(timedelta(seconds=10), reason="spamming")
 
             else:
                 await self.automute(message.author,
-                            reason=f"spamming.\n<@&{int(os.getenv('MODERATOR_ROLE_ID'))}>"
+                            reason=f"spamming.\n{self.moderator_ping(message.guild)}"
                                     )
 
-                message_cache[user_id] = []
-                warned_users.pop(user_id, None)
-                cooldown_cache[user_id] = now
+                message_cache[cache_key] = []
+                warned_users.pop(cache_key, None)
+                cooldown_cache[cache_key] = now
 
         if len(message.mentions) >= 4:
-            await message.channel.send("Please stop spamming mentions or you may be muted")
+            self.bot.outbound.send(message.channel, MODERATION, "Please stop spamming mentions or you may be muted")
 
 
 
 async def setup(bot):
-    anti_raid = AntiRaid(bot)
-    await anti_raid.initialize()
-    await bot.add_cog(anti_raid)
+    await bot.add_cog(AntiRaid(bot))
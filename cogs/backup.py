@@ -0,0 +1,75 @@
+import os
+import csv
+import asyncio
+import tempfile
+import discord
+from datetime import datetime, timezone
+from discord.ext import commands
+
+import dbtools
+
+BACKUP_DIR = 'backups'
+EXPORT_FORMATS = ('jsonl', 'csv')
+
+class Backup(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name="backup_db", hidden=True)
+    @commands.is_owner()
+    async def backup_db(self, ctx):
+        """Take an online snapshot of levels.db without pausing the bot."""
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        dest = os.path.join(BACKUP_DIR, f"levels-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.db")
+        # The backup pauses between page steps, run it off the event loop
+        restarts = await asyncio.to_thread(dbtools.backup, dest)
+        await ctx.send(f"Backup written to `{dest}` ({restarts} restarts from concurrent writes)")
+
+    @commands.command(name="export_levels", hidden=True)
+    @commands.guild_only()
+    @commands.is_owner()
+    async def export_levels(self, ctx, fmt: str = "jsonl"):
+        """Export this guild's levels as gzipped JSON Lines or CSV."""
+        if fmt not in EXPORT_FORMATS:
+            await ctx.send(f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"levels-{ctx.guild.id}.{fmt}.gz")
+            count = await asyncio.to_thread(dbtools.export_levels, ctx.guild.id, path)
+            await ctx.send(f"Exported {count} users.", file=discord.File(path))
+
+    @commands.command(name="restore_levels", hidden=True)
+    @commands.guild_only()
+    @commands.is_owner()
+    async def restore_levels(self, ctx):
+        """Import an attached export into this guild, overwriting the users it contains."""
+        if not ctx.message.attachments:
+            await ctx.send("Please attach a .jsonl or .csv export, optionally gzipped.")
+            return
+
+        attachment = ctx.message.attachments[0]
+        if not attachment.filename.removesuffix('.gz').endswith(tuple(f".{fmt}" for fmt in EXPORT_FORMATS)):
+            await ctx.send("The attached file must be a .jsonl or .csv export, optionally gzipped.")
+            return
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, attachment.filename)
+            await attachment.save(path)
+            try:
+                count = await asyncio.to_thread(dbtools.import_levels, path, ctx.guild.id)
+            except dbtools.ImportFailed as e:
+                await ctx.send(f"Import failed part way, {e.committed} users were already imported: {e}")
+                return
+            except (ValueError, OSError, csv.Error) as e:
+                # Raised while validating, before anything is written
+                await ctx.send(f"Could not read the export, nothing was imported: {e}")
+                return
+            finally:
+                self.bot.leaderboard_cache.invalidate(ctx.guild.id)
+
+        await ctx.send(f"Imported {count} users into the leaderboard.")
+
+
+async def setup(bot):
+    await bot.add_cog(Backup(bot))
@@ -0,0 +1,52 @@
+import discord
+from discord.ext import commands
+
+from settings import SETTINGS
+
+class Config(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.group(name="config", invoke_without_command=True)
+    @commands.guild_only()
+    @commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+    async def config(self, ctx):
+        """Show this guild's settings."""
+        settings = self.bot.settings.for_guild(ctx.guild.id)
+        embed = discord.Embed(title=f"Settings for {ctx.guild.name}", color=discord.Color.blue())
+        for key in SETTINGS:
+            value = settings.get(key)
+            embed.add_field(name=key, value=str(value) if value is not None else "Not set", inline=False)
+        await ctx.send(embed=embed)
+
+    @config.command(name="set")
+    @commands.has_permissions(administrator=True)
+    async def config_set(self, ctx, key: str, *, value: str):
+        """Set one of this guild's settings, IDs can be given as mentions."""
+        try:
+            parsed = await self.bot.settings.set(ctx.guild.id, key, value)
+        except ValueError as e:
+            await ctx.send(f"{e}. Known settings: {', '.join(SETTINGS)}")
+            return
+        await ctx.send(f"Set `{key}` to `{parsed}`.")
+
+    @config.command(name="unset")
+    @commands.has_permissions(administrator=True)
+    async def config_unset(self, ctx, key: str):
+        """Remove one of this guild's settings."""
+        if key not in SETTINGS:
+            await ctx.send(f"Unknown setting `{key}`. Known settings: {', '.join(SETTINGS)}")
+            return
+        await self.bot.settings.unset(ctx.guild.id, key)
+        await ctx.send(f"Unset `{key}`.")
+
+    @config.command(name="reload")
+    @commands.is_owner()
+    async def config_reload(self, ctx):
+        """Reload every guild's settings from the database."""
+        await self.bot.settings.load()
+        await ctx.send(f"Reloaded settings for {len(self.bot.settings.snapshot)} guilds.")
+
+
+async def setup(bot):
+    await bot.add_cog(Config(bot))
@@ -1,8 +1,8 @@
-import os
 import asyncio
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
+from outbound import WELCOME
 load_dotenv()
 
 class Join(commands.Cog):
@@ -11,14 +11,22 @@ class Join(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
-        channel = self.bot.get_channel(int(os.getenv('INVMSG_CHANNEL_ID')))
-        await channel.send(
-            f"Hi there {member.mention}! Thanks for joining the server!\n"
-            f"If you react to this message in <#958385865372098610>  "
-            f"you can see all of the channels we have to offer! "
-            f"https://discord.com/channels/958378689169621012/958385865372098610/958427189915820042"
-        )
+        settings = self.bot.settings.for_guild(member.guild.id)
+        channel = self.bot.get_channel(settings.get('welcome_channel_id'))
+        if channel is None:
+            return
+
+        message = f"Hi there {member.mention}! Thanks for joining the server!\n"
+        roles_channel_id = settings.get('roles_channel_id')
+        roles_message_id = settings.get('roles_message_id')
+        if roles_channel_id and roles_message_id:
+            message += (
+                f"If you react to this message in <#{roles_channel_id}>  "
+                f"you can see all of the channels we have to offer! "
+                f"https://discord.com/channels/{member.guild.id}/{roles_channel_id}/{roles_message_id}"
+            )
+        self.bot.outbound.send(channel, WELCOME, message)
 
 
 async def setup(bot):
-    await bot.add_cog(Join(bot))
\ No newline at end of file
+    await bot.add_cog(Join(bot))
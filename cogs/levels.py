@@ -1,21 +1,37 @@
-import os
+import re
 import json
 import random
 import discord
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta, timezone
 import asyncio
+import time
 from sqlalchemy import delete, True_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import sessionmaker
-from db import Level, SessionLocal, engine # Assuming db.py contains the database setup
+from db import Level, SessionLocal, engine, record_xp, top_xp_since, prune_xp_rollups, HOUR, DAY, WEEK # Assuming db.py contains the database setup
+from outbound import LEVEL_UP
+
+# window unit -> (rollup granularity, seconds per unit, longest window kept by that rollup)
+WINDOW_UNITS = {
+    "h": ("hour", HOUR, 48),
+    "d": ("day", DAY, 400),
+    "w": ("week", WEEK, 156),
+}
 
 class LevelingCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.last_message_time = {}  # A dictionary to store the last message time for cooldown
-        self.channel_id = int(os.getenv("BOT_CID"))
+        self.prune_rollups.start()
+
+    def cog_unload(self):
+        self.prune_rollups.cancel()
+
+    @tasks.loop(hours=1)
+    async def prune_rollups(self):
+        await prune_xp_rollups()
 
     @staticmethod
     async def get_user_data(guild_id, user_id):
@@ -32,12 +48,15 @@ class LevelingCog(commands.Cog):
             return user_data
 
     # Function to update user data (XP and level)
-    async def update_user_data(self, guild_id, user_id, xp, level):
+    async def update_user_data(self, guild_id, user_id, xp, level, xp_gained=0):
         async with SessionLocal() as session:
             user_data = await self.get_user_data(guild_id, user_id)
             user_data.xp = xp
             user_data.level = level
             session.add(user_data)
+            # Written in the same transaction as the total so the history never drifts from it
+            if xp_gained:
+                await record_xp(session, guild_id, user_id, xp_gained)
             await session.commit()
 
     # Function to calculate level from XP (example formula)
@@ -60,7 +79,8 @@ class LevelingCog(commands.Cog):
             new_level += 1
 
         # Update user data with the new XP and level
-        await self.update_user_data(user_data.guild_id, user_data.user_id, new_xp, new_level)
+        await self.update_user_data(user_data.guild_id, user_data.user_id, new_xp, new_level, xp_gained=xp_to_add)
+        self.bot.leaderboard_cache.note_xp_change(user_data.guild_id, user_data.user_id, new_xp, new_level)
 
         # Check if a level-up occurred
         if new_level > current_level:
@@ -103,7 +123,8 @@ class LevelingCog(commands.Cog):
             )
             embed.add_field(name="New Level", value=f"Level {new_level}", inline=False)
             embed.add_field(name="XP Gained", value=f"+{xp_to_add} XP", inline=False)
-            await self.bot.get_channel(self.channel_id).send(embed=embed)
+            channel = self.bot.get_channel(self.bot.settings.get(guild_id, 'level_channel_id'))
+            self.bot.outbound.send(channel, LEVEL_UP, embed=embed)
 
     @staticmethod
     def xp_for_level(level: int) -> int:
@@ -175,18 +196,31 @@ class LevelingCog(commands.Cog):
         """Display the leaderboard for the current guild"""
         guild_id = ctx.guild.id
 
-        async with SessionLocal() as session:
-            # Fetch the top 10 users in the guild, ordered by XP descending
-            stmt = (
-                select(Level)
-                .filter(Level.guild_id == guild_id)
-                .order_by(Level.xp.desc())
-                .limit(10)
-            )
-            result = await session.execute(stmt)
-            top_users = result.scalars().all()
-
-        if not top_users:
+        async def compute():
+            async with SessionLocal() as session:
+                # Fetch the top 10 users in the guild, ordered by XP descending
+                stmt = (
+                    select(Level)
+                    .filter(Level.guild_id == guild_id)
+                    .order_by(Level.xp.desc())
+                    .limit(10)
+                )
+                result = await session.execute(stmt)
+                top_users = result.scalars().all()
+
+            if not top_users:
+                return None
+
+            members = await self.bot.member_resolver.resolve_many(ctx.guild, [user.user_id for user in top_users])
+            fields = []
+            for idx, user in enumerate(top_users, start=1):
+                member = members.get(user.user_id)  # Get the Discord member object
+                username = member.mention if member else "Unknown User"
+                fields.append(f"#{idx}: {username} | Level: {user.level} | XP: {user.xp}")
+            return "xp", [(user.user_id, user.xp) for user in top_users], fields, len(top_users) == 10
+
+        fields = await self.bot.leaderboard_cache.get(guild_id, "topten", 0, compute)
+        if not fields:
             await ctx.send("No leaderboard data available yet!")
             return
 
@@ -196,18 +230,68 @@ class LevelingCog(commands.Cog):
             description="Top 10 Users by XP",
             color=discord.Color.gold()
         )
+        for value in fields:
+            embed.add_field(name="", value=value, inline=False)
+
+        await ctx.send(embed=embed)
 
-        for idx, user in enumerate(top_users, start=1):
-            member = ctx.guild.get_member(user.user_id)  # Get the Discord member object
+    @staticmethod
+    def parse_window(window: str):
+        """Parse a window such as 24h, 7d or 4w into (granularity, lookback in seconds), or None if invalid."""
+        # [0-9] rather than \d or isdigit(), which also accept superscripts and other scripts' digits
+        match = re.fullmatch(r"([0-9]+)([a-z])", window.strip().lower())
+        unit = WINDOW_UNITS.get(match[2]) if match else None
+        if unit is None:
+            return None
+        granularity, seconds, max_count = unit
+        count = int(match[1])
+        if not 1 <= count <= max_count:
+            return None
+        # The current, partly elapsed bucket counts as the first of the window
+        return granularity, (count - 1) * seconds
+
+    async def send_window_leaderboard(self, ctx, window: str, label: str):
+        parsed = self.parse_window(window)
+        if parsed is None:
+            await ctx.send("Please give a window like `24h` (up to 48h), `7d` (up to 400d) or `4w` (up to 156w).")
+            return
+
+        granularity, lookback = parsed
+        top_users = await top_xp_since(ctx.guild.id, granularity, time.time() - lookback)
+
+        if not top_users:
+            await ctx.send(f"No XP has been earned in the {label} yet!")
+            return
+
+        embed = discord.Embed(
+            title=f"Leaderboard for {ctx.guild.name}",
+            description=f"Top 10 Users by XP gained in the {label}",
+            color=discord.Color.gold()
+        )
+
+        members = await self.bot.member_resolver.resolve_many(ctx.guild, [user_id for user_id, _ in top_users])
+        for idx, (user_id, xp) in enumerate(top_users, start=1):
+            member = members.get(user_id)
             username = member.mention if member else "Unknown User"
-            embed.add_field(
-                name="",
-                value=f"#{idx}: {username} | Level: {user.level} | XP: {user.xp}",
-                inline=False
-            )
+            embed.add_field(name="", value=f"#{idx}: {username} | XP: {xp}", inline=False)
 
         await ctx.send(embed=embed)
 
+    @commands.command()
+    async def topweek(self, ctx):
+        """Display the top 10 users by XP gained over the last 7 days"""
+        await self.send_window_leaderboard(ctx, "7d", "last 7 days")
+
+    @commands.command()
+    async def topmonth(self, ctx):
+        """Display the top 10 users by XP gained over the last 30 days"""
+        await self.send_window_leaderboard(ctx, "30d", "last 30 days")
+
+    @commands.command()
+    async def top(self, ctx, window: str):
+        """Display the top 10 users by XP gained over a window such as 24h, 7d or 4w"""
+        await self.send_window_leaderboard(ctx, window, f"last {window}")
+
     @commands.command(hidden=True)
     @commands.has_permissions(administrator=True)  # Restrict to administrators (modify as needed)
     async def add_xp(self, ctx, member: discord.Member, xp: int):
@@ -235,6 +319,7 @@ class LevelingCog(commands.Cog):
             user_data.level = self.calculate_level(user_data.xp)
 
             await session.commit()
+        self.bot.leaderboard_cache.invalidate(guild_id)
 
         await ctx.send(f"Added {xp} XP to {member.display_name}. They are now Level {user_data.level}!")
 
@@ -264,6 +349,7 @@ class LevelingCog(commands.Cog):
             user_data.level = self.calculate_level(user_data.xp)  # Recalculate level
 
             await session.commit()
+        self.bot.leaderboard_cache.invalidate(guild_id)
 
         await ctx.send(f"Removed {xp} XP from {member.display_name}. They are now Level {user_data.level}!")
 
@@ -319,6 +405,7 @@ class LevelingCog(commands.Cog):
 
                 # Commit changes to the database
                 await session.commit()
+            self.bot.leaderboard_cache.invalidate(guild_id)
 
             await ctx.send("Level data imported successfully! Existing data has been overwritten.")
 
@@ -334,20 +421,12 @@ class LevelingCog(commands.Cog):
         guild_id = ctx.guild.id
         user_id = ctx.author.id
 
-        async with SessionLocal() as session:
-            # Get the user's current level and position
-            stmt = select(Level).filter(Level.guild_id == guild_id, Level.user_id == user_id)
-            result = await session.execute(stmt)
-            user_data = result.scalars().first()
-
-            if not user_data:
-                await ctx.send(f"{ctx.author.mention}, you don't have any level data yet!")
-                return
-
-            # Get all users in the guild ordered by level descending
-            stmt = select(Level).filter(Level.guild_id == guild_id).order_by(Level.level.desc())
-            result = await session.execute(stmt)
-            all_users = result.scalars().all()
+        async def compute():
+            async with SessionLocal() as session:
+                # Get all users in the guild ordered by level descending
+                stmt = select(Level).filter(Level.guild_id == guild_id).order_by(Level.level.desc())
+                result = await session.execute(stmt)
+                all_users = result.scalars().all()
 
             # Find the index of the current user
             user_position = None
@@ -357,33 +436,40 @@ class LevelingCog(commands.Cog):
                     break
 
             if user_position is None:
-                await ctx.send("Could not find your position in the leaderboard.")
-                return
+                return None
 
             # Fetch the 2 users behind the current user, the user, and 7 users ahead of them
             start_index = max(0, user_position - 8)  # Ensure no negative index
             end_index = min(len(all_users), user_position + 3)  # Ensure we don't go out of bounds
             leaderboard = all_users[start_index:end_index]
 
+            members = await self.bot.member_resolver.resolve_many(ctx.guild, [user.user_id for user in leaderboard])
+            fields = []
+            for idx, user in enumerate(leaderboard):
+                member = members.get(user.user_id)  # Get the Discord member object
+                username = member.mention if member else "Unknown User"
+
+                # Correct the rank to reflect the user's position in the leaderboard
+                rank = start_index + idx + 1  # Adjust rank accordingly to the slice's starting position
+                fields.append(f"#{rank} {username} Level: {user.level} | XP: {user.xp}")
+            # The window is cut short at the bottom of the list, where newcomers would show up
+            full = end_index == user_position + 3
+            return "level", [(user.user_id, user.level) for user in leaderboard], fields, full
+
+        # Anchored on the invoking user, since the window is centred on their position
+        fields = await self.bot.leaderboard_cache.get(guild_id, "leaderboard", user_id, compute)
+        if not fields:
+            await ctx.send(f"{ctx.author.mention}, you don't have any level data yet!")
+            return
+
         # Create the embed to send
         embed = discord.Embed(
             title=f"Leaderboard for {ctx.guild.name}",
             description=f"Here are the users around you in the leaderboard based on level:",
             color=discord.Color.gold()
         )
-
-        for idx, user in enumerate(leaderboard):
-            member = ctx.guild.get_member(user.user_id)  # Get the Discord member object
-            username = member.mention if member else "Unknown User"
-
-            # Correct the rank to reflect the user's position in the leaderboard
-            rank = start_index + idx + 1  # Adjust rank accordingly to the slice's starting position
-
-            embed.add_field(
-                name="",
-                value=f"#{rank} {username} Level: {user.level} | XP: {user.xp}",
-                inline=False
-            )
+        for value in fields:
+            embed.add_field(name="", value=value, inline=False)
 
         await ctx.send(embed=embed)
 
@@ -395,17 +481,19 @@ class LevelingCog(commands.Cog):
             result = await session.execute(query)
             all_users = result.scalars().all()
 
-            guild_user_ids = {member.id for member in ctx.guild.members}
+            # Stream member IDs and strike off everyone still in the guild, whoever is left has departed
+            departed_user_ids = {user.user_id for user in all_users}
+            async for chunk in self.bot.member_resolver.iter_member_id_chunks(ctx.guild):
+                departed_user_ids.difference_update(chunk)
             removed_user_ids = []
 
             for user in all_users:
-                if user.user_id not in guild_user_ids:
-                    user_data = await session.get(Level, (ctx.guild.id, user.user_id))
-                    if user_data:
-                        await session.delete(user_data)
-                        removed_user_ids.append(user.user_id)
+                if user.user_id in departed_user_ids:
+                    await session.delete(user)
+                    removed_user_ids.append(user.user_id)
 
             await session.commit()
+            self.bot.leaderboard_cache.invalidate(ctx.guild.id)
 
             header = f"Removed {len(removed_user_ids)} users from the leaderboard.\nUsers removed:\n"
             max_chunk_size = 2000 - len(header)
@@ -1,70 +1,82 @@
 import discord
-import os
 
 from aiohttp import payload
+from collections import defaultdict
 from discord.ext import commands
 from datetime import datetime, timezone
+from outbound import LOG
 
 class ReactionLogger(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.stats = 0
-        self.channel_id = int(os.getenv('CHNL_ID'))
-        self.reactions = []
+        self.reactions = defaultdict(list)  # guild_id -> reactions waiting to be logged
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         """Triggered when a reaction is added."""
+        if payload.guild_id is None:
+            return
         reaction_data = {
             "emoji": payload.emoji,
             "user_id": payload.user_id,
+            "user_name": payload.member.name if payload.member else None,  # Members are not cached in lean mode
             "guild_id": payload.guild_id,
             "channel_id": payload.channel_id,
             "message_id": payload.message_id,
             "timestamp": datetime.now(timezone.utc).strftime('%m-%d %H:%M:%S'),
             "action": "added"
         }
-        self.reactions.append(reaction_data)
+        self.reactions[payload.guild_id].append(reaction_data)
         self.stats += 1
 
         # Automatically send reactions if the list reaches 50
-        if len(self.reactions) >= 25:
-            await self.handle_reactions()
+        if len(self.reactions[payload.guild_id]) >= 25:
+            await self.handle_reactions(payload.guild_id)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
         """Triggered when a reaction is removed."""
+        if payload.guild_id is None:
+            return
         reaction_data = {
             "emoji": payload.emoji,
             "user_id": payload.user_id,
+            "user_name": None,  # Removal events carry no member, resolved when the log is sent
             "guild_id": payload.guild_id,
             "channel_id": payload.channel_id,
             "message_id": payload.message_id,
             "timestamp": datetime.now(timezone.utc).strftime('%m-%d %H:%M:%S'),
             "action": "removed"
         }
-        self.reactions.append(reaction_data)
+        self.reactions[payload.guild_id].append(reaction_data)
         self.stats += 1
-        if len(self.reactions) >= 25:
-            await self.handle_reactions()
+        if len(self.reactions[payload.guild_id]) >= 25:
+            await self.handle_reactions(payload.guild_id)
 
     @commands.Cog.listener()
     @commands.cooldown(1, 10.0 , commands.BucketType.user)
     async def on_message(self, message: discord.Message):
-        if message.content.startswith("<@1311839620161601546>"):
+        if message.content.startswith(f"<@{self.bot.user.id}>"):
             await message.reply("I log reactions and xp :3\n"
                                 "-# Coded by SpiritTheWalf", mention_author=False)
 
-    async def compile_footer_data(self):
+    async def compile_footer_data(self, guild_id, reactions):
         footer_data = ""
-        for reaction in self.reactions:
+        # Look up everyone whose name was not captured with the event in one batch
+        unnamed = {reaction["user_id"] for reaction in reactions if reaction["user_name"] is None}
+        guild = self.bot.get_guild(guild_id)
+        members = await self.bot.member_resolver.resolve_many(guild, list(unnamed)) if unnamed and guild else {}
+        for reaction in reactions:
             if isinstance(reaction["emoji"], discord.PartialEmoji) and reaction["emoji"].is_custom_emoji():
                 emoji = f"<:{reaction['emoji'].name}:{reaction['emoji'].id}>"
             else:
                 emoji = reaction["emoji"].name
 
-            user = self.bot.get_user(reaction["user_id"])
-            if user:
+            user = members.get(reaction["user_id"]) or self.bot.get_user(reaction["user_id"])
+            if reaction["user_name"]:
+                user_name = reaction["user_name"]
+            elif user:
                 user_name = user.name
             else:
                 user_name = "Unknown User"
@@ -78,13 +90,12 @@ class ReactionLogger(commands.Cog):
 
         return footer_data
 
-    async def handle_reactions(self):
+    async def handle_reactions(self, guild_id):
         embed = discord.Embed(title="Reactions logged")
-        channel = self.bot.get_channel(self.channel_id)
-        footer = await self.compile_footer_data()
+        channel = self.bot.get_channel(self.bot.settings.get(guild_id, 'log_channel_id'))
+        footer = await self.compile_footer_data(guild_id, self.reactions.pop(guild_id, []))
         embed.description = footer
-        self.reactions.clear()
-        await channel.send(embed=embed)
+        self.bot.outbound.send(channel, LOG, embed=embed)
 
     @commands.command(name="stats")
     @commands.has_permissions(administrator=True)
@@ -95,8 +106,8 @@ class ReactionLogger(commands.Cog):
     @commands.command(name="send_reactions")
     @commands.has_permissions(administrator=True)
     async def send_reactions(self, ctx):
-        if self.reactions:
-            await self.handle_reactions()
+        if self.reactions.get(ctx.guild.id):
+            await self.handle_reactions(ctx.guild.id)
         else:
             await ctx.send("No reactions logged yet")
 
@@ -1,5 +1,7 @@
 import asyncio
-from sqlalchemy import Column, Integer, BigInteger
+import time
+from sqlalchemy import Column, Integer, BigInteger, String, Index, delete, func
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
@@ -16,6 +18,38 @@ class Level(Base):
     xp = Column(Integer, default=0)
     level = Column(Integer, default=1)
 
+class XpRollup(Base):
+    """XP gained per user in one hour, day or week, primary key ordered for window scans."""
+    __tablename__ = 'xp_rollups'
+
+    guild_id = Column(BigInteger, primary_key=True)
+    granularity = Column(String(4), primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)  # Unix timestamp of the bucket start
+    user_id = Column(BigInteger, primary_key=True)
+    xp = Column(Integer, default=0)
+
+    # Lets the retention prune find expired buckets without scanning every guild
+    __table_args__ = (Index('ix_xp_rollups_granularity_bucket', 'granularity', 'bucket'),)
+
+class GuildSetting(Base):
+    __tablename__ = 'guild_settings'
+
+    guild_id = Column(BigInteger, primary_key=True)
+    key = Column(String(64), primary_key=True)
+    value = Column(String, nullable=False)
+
+HOUR = 3600
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+WEEK_OFFSET = 4 * DAY  # The epoch was a Thursday, weeks start on Monday
+
+# granularity -> (bucket size, retention) in seconds
+ROLLUPS = {
+    'hour': (HOUR, 2 * DAY),
+    'day': (DAY, 400 * DAY),
+    'week': (WEEK, 3 * 365 * DAY),
+}
+
 DATABASE_URL = 'sqlite+aiosqlite:///levels.db'
 
 engine = create_async_engine(DATABASE_URL, future=True)
@@ -24,6 +58,9 @@ SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False,
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips indexes of tables that already exist
+        for index in XpRollup.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
 
 async def get_user_data(guild_id, user_id):
     async with SessionLocal() as session:
@@ -39,3 +76,56 @@ async def update_user_data(guild_id, user_id, xp, level):
         user_data.level = level
         session.add(user_data)
         await session.commit()
+
+def bucket_start(granularity, timestamp):
+    size = ROLLUPS[granularity][0]
+    offset = WEEK_OFFSET if granularity == 'week' else 0
+    return (int(timestamp) - offset) // size * size + offset
+
+async def record_xp(session, guild_id, user_id, xp, timestamp=None):
+    """Add XP to every rollup bucket covering the timestamp, committed along with the caller's session."""
+    timestamp = time.time() if timestamp is None else timestamp
+    for granularity in ROLLUPS:
+        stmt = insert(XpRollup).values(
+            guild_id=guild_id,
+            granularity=granularity,
+            bucket=bucket_start(granularity, timestamp),
+            user_id=user_id,
+            xp=xp
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[XpRollup.guild_id, XpRollup.granularity, XpRollup.bucket, XpRollup.user_id],
+            set_={'xp': XpRollup.xp + stmt.excluded.xp}
+        )
+        await session.execute(stmt)
+
+async def top_xp_since(guild_id, granularity, since, limit=10):
+    """Return (user_id, xp) pairs for the users who gained the most XP in buckets starting at or after since."""
+    async with SessionLocal() as session:
+        total = func.sum(XpRollup.xp).label('total')
+        stmt = (
+            select(XpRollup.user_id, total)
+            .filter(
+                XpRollup.guild_id == guild_id,
+                XpRollup.granularity == granularity,
+                XpRollup.bucket >= bucket_start(granularity, since)
+            )
+            .group_by(XpRollup.user_id)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+        result = await session.execute(stmt)
+        return result.all()
+
+async def prune_xp_rollups(timestamp=None):
+    """Delete rollup buckets older than their granularity's retention."""
+    timestamp = time.time() if timestamp is None else timestamp
+    async with SessionLocal() as session:
+        for granularity, (_, retention) in ROLLUPS.items():
+            await session.execute(
+                delete(XpRollup).filter(
+                    XpRollup.granularity == granularity,
+                    XpRollup.bucket < timestamp - retention
+                )
+            )
+        await session.commit()
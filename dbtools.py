@@ -0,0 +1,200 @@
+import argparse
+import csv
+import gzip
+import json
+import sqlite3
+import time
+
+DATABASE_PATH = 'levels.db'
+COLUMNS = ('guild_id', 'user_id', 'xp', 'level')
+BATCH_SIZE = 500
+PAGE_SIZE = 1000
+MAX_BACKUP_RESTARTS = 3
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def backup(dest_path, pages=64, sleep=0.05, progress=None):
+    """
+    Take a consistent online snapshot of the database using SQLite's incremental backup API.
+    Copies `pages` pages per step and sleeps between steps, the source is not locked between steps
+    so the bot's writers get a chance to commit while the backup runs.
+    Every commit from another connection restarts the copy, so after MAX_BACKUP_RESTARTS restarts
+    the rest is copied in a single step, which holds the read lock but always finishes.
+    """
+    restarts = 0
+    last_remaining = None
+
+    def step_done(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_BACKUP_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+        if progress is not None:
+            progress(status, remaining, total)
+        # sqlite3 only sleeps by itself when a step hits a lock, so pause here after every step
+        if remaining:
+            time.sleep(sleep)
+
+    src = sqlite3.connect(DATABASE_PATH)
+    dest = sqlite3.connect(dest_path)
+    try:
+        try:
+            with dest:
+                src.backup(dest, pages=pages, progress=step_done)
+        except _BackupRestarted:
+            with dest:
+                src.backup(dest, pages=-1)
+    finally:
+        dest.close()
+        src.close()
+    return restarts
+
+
+def _open(path, mode):
+    """Open a text file for streaming, gzip compressed if the name ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def _is_csv(path):
+    return path.removesuffix('.gz').endswith('.csv')
+
+
+def export_levels(guild_id, path):
+    """
+    Stream a guild's rows from the levels table into a JSON Lines or CSV file, returning the row count.
+    Rows are read a page at a time by user ID, each page in its own short read,
+    so the bot's writers are never locked out for the length of the export.
+    """
+    conn = sqlite3.connect(DATABASE_PATH)
+    csv_format = _is_csv(path)
+    count = 0
+    last_user_id = -1
+    try:
+        with _open(path, 'w') as f:
+            if csv_format:
+                writer = csv.writer(f)
+                writer.writerow(COLUMNS)
+            while True:
+                page = conn.execute(
+                    "SELECT guild_id, user_id, xp, level FROM levels "
+                    "WHERE guild_id = ? AND user_id > ? ORDER BY user_id LIMIT ?",
+                    (guild_id, last_user_id, PAGE_SIZE)
+                ).fetchall()
+                if not page:
+                    break
+                for row in page:
+                    if csv_format:
+                        writer.writerow(row)
+                    else:
+                        f.write(json.dumps(dict(zip(COLUMNS, row))) + '\n')
+                count += len(page)
+                last_user_id = page[-1][1]
+    finally:
+        conn.close()
+    return count
+
+
+class ImportFailed(Exception):
+    """Raised when writing an import fails part way, `committed` rows were already written."""
+
+    def __init__(self, committed, error):
+        super().__init__(f"{error} ({committed} rows were already imported)")
+        self.committed = committed
+
+
+def _read_rows(f, csv_format):
+    if csv_format:
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _parse_rows(path, guild_id=None):
+    """Yield (guild_id, user_id, xp, level) tuples from an export, raising ValueError naming the bad row."""
+    with _open(path, 'r') as f:
+        for number, row in enumerate(_read_rows(f, _is_csv(path)), start=1):
+            try:
+                yield (
+                    int(row['guild_id']) if guild_id is None else guild_id,
+                    int(row['user_id']),
+                    int(row['xp']),
+                    int(row['level'])
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Row {number} is invalid: {e!r}") from e
+
+
+def import_levels(path, guild_id=None):
+    """
+    Stream rows from a JSON Lines or CSV export back into the levels table, returning the row count.
+    Existing rows are overwritten, and guild_id moves every row to another guild when given.
+    The whole file is validated before anything is written, then rows are committed in small batches
+    so writers are never locked out for long.
+    """
+    for _ in _parse_rows(path, guild_id):
+        pass
+
+    conn = sqlite3.connect(DATABASE_PATH)
+    stmt = (
+        "INSERT INTO levels (guild_id, user_id, xp, level) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(guild_id, user_id) DO UPDATE SET xp = excluded.xp, level = excluded.level"
+    )
+    count = 0
+    batch = []
+    try:
+        for row in _parse_rows(path, guild_id):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                with conn:
+                    conn.executemany(stmt, batch)
+                count += len(batch)
+                batch.clear()
+        if batch:
+            with conn:
+                conn.executemany(stmt, batch)
+            count += len(batch)
+    except sqlite3.Error as e:
+        raise ImportFailed(count, e) from e
+    finally:
+        conn.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance tools for levels.db")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    backup_parser = subparsers.add_parser('backup', help="Take an online snapshot of the database")
+    backup_parser.add_argument('dest')
+    backup_parser.add_argument('--pages', type=int, default=64, help="Pages copied per step")
+
+    export_parser = subparsers.add_parser('export', help="Export a guild's levels to .jsonl/.csv, optionally .gz")
+    export_parser.add_argument('guild_id', type=int)
+    export_parser.add_argument('path')
+
+    import_parser = subparsers.add_parser('import', help="Import levels from a .jsonl/.csv export, optionally .gz")
+    import_parser.add_argument('path')
+    import_parser.add_argument('--guild', type=int, default=None, help="Import every row into this guild instead")
+
+    args = parser.parse_args()
+    if args.command == 'backup':
+        restarts = backup(args.dest, pages=args.pages,
+                          progress=lambda status, remaining, total: print(f"Copied {total - remaining}/{total} pages"))
+        print(f"Backup written to {args.dest} ({restarts} restarts)")
+    elif args.command == 'export':
+        print(f"Exported {export_levels(args.guild_id, args.path)} rows to {args.path}")
+    elif args.command == 'import':
+        print(f"Imported {import_levels(args.path, args.guild)} rows from {args.path}")
+
+
+if __name__ == "__main__":
+    main()
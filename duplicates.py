@@ -0,0 +1,125 @@
+import re
+import hashlib
+import unicodedata
+from collections import deque
+
+BANDS = 8  # SimHash is split into 8 8-bit bands, so fingerprints within 7 bits share at least one band
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+MAX_DISTANCE = 7  # Unrelated messages sit around 32 bits apart
+MAX_CANDIDATES = 50  # Most recent entries checked per bucket, keeps lookups constant time during floods
+SHINGLE_CHARS = 5
+SIMHASH_CHARS = 500  # Only the start of long messages is shingled, bounding the cost per message
+
+MENTION_REGEX = re.compile(r"<(?:@[!&]?|#)\d+>")
+NON_WORD_REGEX = re.compile(r"[^\w:/.]+")
+INVISIBLE_CHARS = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+
+
+def normalize(content: str) -> str:
+    """Fold case, width and look-alike forms, and drop mentions, invisible characters and punctuation."""
+    content = unicodedata.normalize("NFKC", content).translate(INVISIBLE_CHARS).casefold()
+    content = MENTION_REGEX.sub(" ", content)
+    return " ".join(NON_WORD_REGEX.sub(" ", content).split())
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shingles(text: str):
+    text = text[:SIMHASH_CHARS]
+    return {text[i:i + SHINGLE_CHARS] for i in range(max(1, len(text) - SHINGLE_CHARS + 1))}
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of the text's character shingles.
+    Per-bit votes are kept in bit-sliced counters (counters[i] holds bit i of all 64 counts),
+    so adding a shingle costs a few integer operations instead of a loop over its bits.
+    """
+    counters = []
+    total = 0
+    for shingle in shingles(text):
+        carry = _hash64(shingle)
+        total += 1
+        for i in range(len(counters)):
+            counters[i], carry = counters[i] ^ carry, counters[i] & carry
+            if not carry:
+                break
+        if carry:
+            counters.append(carry)
+
+    fingerprint = 0
+    for bit in range(64):
+        votes = sum((counter >> bit & 1) << i for i, counter in enumerate(counters))
+        if votes * 2 > total:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+class Fingerprint:
+    __slots__ = ("timestamp", "author_id", "channel_id", "message_id", "exact", "simhash", "handled")
+
+    def __init__(self, timestamp, author_id, channel_id, message_id, exact, simhash):
+        self.timestamp = timestamp
+        self.author_id = author_id
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.exact = exact
+        self.simhash = simhash
+        self.handled = False  # Set once mitigation has dealt with this message
+
+    def keys(self):
+        yield ("exact", self.exact)
+        for band in range(BANDS):
+            yield ("band", band, self.simhash >> (band * BAND_BITS) & BAND_MASK)
+
+
+class DuplicateIndex:
+    """
+    Time windowed, size bounded index of recent message fingerprints for one guild.
+    Fingerprints are bucketed by exact hash and by SimHash band, so finding
+    identical or near identical messages only looks at a few small buckets.
+    """
+
+    def __init__(self, window: float, max_entries: int):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = deque()  # Fingerprints in insertion order
+        self._buckets = {}  # key -> deque of Fingerprints, also in insertion order
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now: float):
+        while self._entries and (len(self._entries) > self.max_entries or self._entries[0].timestamp < now - self.window):
+            oldest = self._entries.popleft()
+            # Buckets are filled in insertion order too, so the oldest entry is always at their front
+            for key in oldest.keys():
+                bucket = self._buckets[key]
+                bucket.popleft()
+                if not bucket:
+                    del self._buckets[key]
+
+    def add(self, timestamp: float, author_id: int, channel_id: int, message_id: int, text: str):
+        """Index a normalized message, returning the earlier fingerprints matching it (newest first) and its own."""
+        fingerprint = Fingerprint(timestamp, author_id, channel_id, message_id, _hash64(text), simhash(text))
+        self._evict(timestamp)
+
+        matches = {}
+        for key in fingerprint.keys():
+            bucket = self._buckets.get(key, ())
+            for idx in range(len(bucket) - 1, max(-1, len(bucket) - 1 - MAX_CANDIDATES), -1):
+                candidate = bucket[idx]
+                if id(candidate) in matches:
+                    continue
+                if candidate.exact == fingerprint.exact or bin(candidate.simhash ^ fingerprint.simhash).count("1") <= MAX_DISTANCE:
+                    matches[id(candidate)] = candidate
+
+        self._entries.append(fingerprint)
+        for key in fingerprint.keys():
+            self._buckets.setdefault(key, deque()).append(fingerprint)
+        self._evict(timestamp)
+
+        return sorted(matches.values(), key=lambda entry: entry.timestamp, reverse=True), fingerprint
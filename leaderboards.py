@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+CACHE_TTL = 15  # in seconds, coalesces bursts of the same leaderboard request
+
+
+class CachedView:
+    __slots__ = ("fields", "sort_attr", "user_ids", "floor", "full", "expires_at")
+
+    def __init__(self, fields, sort_attr, rows, full, expires_at):
+        self.fields = fields
+        self.sort_attr = sort_attr
+        self.full = full  # False when the list ran out before the view did, so rows below the floor can still appear
+        self.user_ids = {user_id for user_id, _ in rows}
+        self.floor = min(value for _, value in rows)  # Lowest displayed value, anything at or above it can move a row
+        self.expires_at = expires_at
+
+    def affected_by(self, user_id: int, values: dict) -> bool:
+        """Whether an XP change could move one of the displayed rows."""
+        return not self.full or user_id in self.user_ids or values[self.sort_attr] >= self.floor
+
+
+class LeaderboardCache:
+    """
+    Caches the prepared field list of rendered leaderboards, keyed by guild, view and page/anchor.
+    Entries are dropped once an XP change could move a displayed row, or after CACHE_TTL.
+    Concurrent requests for the same view share a single computation.
+    """
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self._views = {}  # guild_id -> {(view, anchor): CachedView}
+        self._pending = {}  # (guild_id, view, anchor) -> Task
+        self._generations = {}  # guild_id -> invalidation counter, discards results computed across a bulk change
+        self._recorders = {}  # guild_id -> lists collecting the XP changes seen while a compute is running
+
+    async def get(self, guild_id: int, view: str, anchor, compute):
+        """
+        Return the cached fields for a view, or await compute() to build them.
+        compute returns (sort_attr, rows, fields, full) where rows are (user_id, value) pairs and full is
+        whether the view reached its page size, or None if there is nothing to show.
+        """
+        cached = self._views.get(guild_id, {}).get((view, anchor))
+        if cached and cached.expires_at > time.monotonic():
+            return cached.fields
+
+        key = (guild_id, view, anchor)
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fill(guild_id, view, anchor, compute))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fill(self, guild_id, view, anchor, compute):
+        generation = self._generations.get(guild_id, 0)
+        changes = []
+        recorders = self._recorders.setdefault(guild_id, [])
+        recorders.append(changes)
+        try:
+            result = await compute()
+        finally:
+            recorders.remove(changes)
+            if not recorders:
+                del self._recorders[guild_id]
+        if result is None:
+            return None
+
+        sort_attr, rows, fields, full = result
+        if not rows or self._generations.get(guild_id, 0) != generation:
+            return fields
+        now = time.monotonic()
+        cached = CachedView(fields, sort_attr, rows, full, now + self.ttl)
+        # The rows may have been read before or after a change that landed mid compute, only store them if none could matter
+        if not any(cached.affected_by(user_id, values) for user_id, values in changes):
+            views = self._views.setdefault(guild_id, {})
+            for stale_key in [k for k, v in views.items() if v.expires_at <= now]:
+                del views[stale_key]
+            views[(view, anchor)] = cached
+        return fields
+
+    def note_xp_change(self, guild_id: int, user_id: int, xp: int, level: int):
+        """Drop every cached view of the guild whose displayed rows this change could move."""
+        values = {"xp": xp, "level": level}
+        for changes in self._recorders.get(guild_id, ()):
+            changes.append((user_id, values))
+        views = self._views.get(guild_id)
+        if not views:
+            return
+        for key in [k for k, v in views.items() if v.affected_by(user_id, values)]:
+            del views[key]
+
+    def invalidate(self, guild_id: int):
+        """Drop every cached view of the guild, for bulk changes such as imports and trims."""
+        self._generations[guild_id] = self._generations.get(guild_id, 0) + 1
+        self._views.pop(guild_id, None)
@@ -0,0 +1,81 @@
+import asyncio
+from collections import OrderedDict
+
+import discord
+
+QUERY_BATCH_SIZE = 100  # Discord caps query_members at 100 user IDs per request
+
+
+class MemberResolver:
+    """
+    Resolves the handful of members a command actually needs without keeping
+    every member of every guild in the library cache.
+    Misses are stored as None so departed users are not queried again.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()  # (guild_id, user_id) -> Member or None
+
+    def _remember(self, guild_id: int, user_id: int, member):
+        key = (guild_id, user_id)
+        self._cache[key] = member
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def forget(self, guild_id: int, user_id: int):
+        self._cache.pop((guild_id, user_id), None)
+
+    async def resolve_many(self, guild: discord.Guild, user_ids):
+        """Return a dict of user ID -> Member (or None if they are not in the guild)."""
+        resolved = {}
+        missing = []
+        for user_id in user_ids:
+            key = (guild.id, user_id)
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                resolved[user_id] = self._cache[key]
+                continue
+            member = guild.get_member(user_id)  # Still populated in full-cache mode
+            if member is not None:
+                self._remember(guild.id, user_id, member)
+                resolved[user_id] = member
+            else:
+                missing.append(user_id)
+
+        for start in range(0, len(missing), QUERY_BATCH_SIZE):
+            batch = missing[start:start + QUERY_BATCH_SIZE]
+            found = {member.id: member for member in await self._query(guild, batch)}
+            for user_id in batch:
+                member = found.get(user_id)
+                self._remember(guild.id, user_id, member)
+                resolved[user_id] = member
+
+        return resolved
+
+    @staticmethod
+    async def _query(guild: discord.Guild, user_ids):
+        try:
+            return await guild.query_members(user_ids=user_ids, limit=len(user_ids), cache=False)
+        except (discord.ClientException, asyncio.TimeoutError):
+            # No gateway access to member chunks, fall back to REST lookups
+            members = []
+            for user_id in user_ids:
+                try:
+                    members.append(await guild.fetch_member(user_id))
+                except discord.NotFound:
+                    pass
+            return members
+
+    @staticmethod
+    async def iter_member_id_chunks(guild: discord.Guild, chunk_size: int = 1000):
+        """Stream the IDs of all guild members in chunks, without caching the members."""
+        chunk = []
+        async for member in guild.fetch_members(limit=None):
+            chunk.append(member.id)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
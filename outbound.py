@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+import discord
+
+# Priority classes, lower is sent first
+MODERATION = 0
+WELCOME = 1
+LEVEL_UP = 2
+LOG = 3
+
+COALESCE_PRIORITIES = {LOG}  # Low priority messages to the same channel may be combined into one send
+MAX_EMBEDS = 10  # Discord allows up to 10 embeds per message
+MAX_CONTENT = 2000
+MAX_EMBED_CHARS = 6000  # Discord's limit on the combined text of all embeds in one message
+MAX_QUEUED = 100  # Per channel, past this the oldest lowest priority message is dropped
+
+# Fixed pacing modelled on Discord's limits, discord.py retries 429s itself and does not expose the route buckets.
+# Per channel, the message route allows 5 sends every 5 seconds
+BUCKET_CAPACITY = 5
+BUCKET_PERIOD = 5.0
+# Across all channels, below Discord's global 50 requests per second to leave room for the bot's other requests
+GLOBAL_CAPACITY = 40
+GLOBAL_PERIOD = 1.0
+
+
+class TokenBucket:
+    def __init__(self, capacity: int = BUCKET_CAPACITY, period: float = BUCKET_PERIOD):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is available now."""
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def penalize(self, period: float):
+        """Empty the bucket after a 429 so the channel waits a full period before sending again."""
+        self.tokens = -period * self.rate + 1
+        self.updated = time.monotonic()
+
+
+class OutgoingMessage:
+    __slots__ = ("channel", "content", "embeds", "kwargs")
+
+    def __init__(self, channel, content, embeds, kwargs):
+        self.channel = channel
+        self.content = content
+        self.embeds = embeds
+        self.kwargs = kwargs
+
+    def can_merge(self, other: "OutgoingMessage") -> bool:
+        if self.kwargs or other.kwargs:
+            return False
+        content_length = len(self.content or "") + len(other.content or "") + 1
+        embed_chars = sum(len(embed) for embed in self.embeds) + sum(len(embed) for embed in other.embeds)
+        return (
+            len(self.embeds) + len(other.embeds) <= MAX_EMBEDS
+            and content_length <= MAX_CONTENT
+            and embed_chars <= MAX_EMBED_CHARS
+        )
+
+    def merge(self, other: "OutgoingMessage"):
+        if other.content:
+            self.content = f"{self.content}\n{other.content}" if self.content else other.content
+        self.embeds.extend(other.embeds)
+
+
+class OutboundScheduler:
+    """
+    Central queue for messages sent from event handlers.
+    Each channel has its own priority queue and token bucket, and a single dispatcher
+    always sends the highest priority message among the channels that may send now,
+    under a global token bucket. Handlers return as soon as their message is enqueued,
+    and a slow or rate limited channel only delays itself.
+    """
+
+    def __init__(self):
+        self._queues = {}  # channel_id -> heap of (priority, seq, OutgoingMessage)
+        self._buckets = {}  # channel_id -> TokenBucket
+        self._global_bucket = TokenBucket(GLOBAL_CAPACITY, GLOBAL_PERIOD)
+        self._busy = set()  # Channels with a send in flight, one at a time keeps each channel in order
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+        self._sends = set()
+        self._seq = itertools.count()
+
+    def send(self, channel: discord.abc.Messageable, priority: int = LOG, content: str = None, embed: discord.Embed = None, **kwargs):
+        """Enqueue a message for the channel and return immediately."""
+        if channel is None:
+            return
+        embeds = [embed] if embed is not None else []
+        message = OutgoingMessage(channel, content, embeds, kwargs)
+        queue = self._queues.setdefault(channel.id, [])
+        heapq.heappush(queue, (priority, next(self._seq), message))
+        if len(queue) > MAX_QUEUED:
+            self._drop_oldest(channel.id, queue)
+
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+    @staticmethod
+    def _drop_oldest(channel_id, queue):
+        # The oldest entry of the lowest priority class present, normally a LOG
+        victim = max(queue, key=lambda entry: (entry[0], -entry[1]))
+        queue.remove(victim)
+        heapq.heapify(queue)
+        print(f"Outbound queue for channel {channel_id} is full, dropped a priority {victim[0]} message")
+
+    def _next_batch(self, queue):
+        priority, _, message = heapq.heappop(queue)
+        if priority in COALESCE_PRIORITIES:
+            while queue and queue[0][0] == priority and message.can_merge(queue[0][2]):
+                message.merge(heapq.heappop(queue)[2])
+        return message
+
+    def _next_channel(self):
+        """Return (channel_id, None) for the ready channel with the highest priority head, or (None, seconds until one may be ready)."""
+        best = None
+        wait = None
+        for channel_id, queue in self._queues.items():
+            if channel_id in self._busy:
+                continue
+            delay = self._buckets.setdefault(channel_id, TokenBucket()).delay()
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+            elif best is None or queue[0] < self._queues[best][0]:
+                best = channel_id
+        return best, wait
+
+    async def _dispatch(self):
+        while self._queues:
+            global_delay = self._global_bucket.delay()
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+                continue
+
+            self._wakeup.clear()
+            channel_id, wait = self._next_channel()
+            if channel_id is None:
+                # Wait for a bucket to refill, a send to finish or a new message
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._global_bucket.take()
+            self._buckets[channel_id].take()
+            queue = self._queues[channel_id]
+            message = self._next_batch(queue)
+            if not queue:
+                del self._queues[channel_id]
+
+            self._busy.add(channel_id)
+            task = asyncio.create_task(self._deliver(channel_id, message))
+            self._sends.add(task)
+            task.add_done_callback(self._sends.discard)
+
+    async def _deliver(self, channel_id: int, message: OutgoingMessage):
+        try:
+            await message.channel.send(content=message.content, embeds=message.embeds, **message.kwargs)
+        except discord.HTTPException as e:
+            if e.status == 429:  # discord.py gave up retrying, back off the whole channel
+                self._buckets[channel_id].penalize(BUCKET_PERIOD)
+            print(f"Failed to send message to channel {channel_id}: {e}")
+        finally:
+            self._busy.discard(channel_id)
+            self._wakeup.set()
+
+    async def close(self):
+        """Cancel the dispatcher and in-flight sends, dropping whatever is still queued."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        for task in list(self._sends):
+            task.cancel()
+        self._sends.clear()
+        self._queues.clear()
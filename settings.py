@@ -0,0 +1,143 @@
+import os
+import re
+from types import MappingProxyType
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.future import select
+
+from db import GuildSetting, SessionLocal
+
+# Known settings and the type their stored value is parsed into
+SETTINGS = {
+    'level_channel_id': int,  # Where level-up announcements go
+    'log_channel_id': int,  # Where reaction logs go
+    'welcome_channel_id': int,  # Where new members are greeted
+    'roles_channel_id': int,  # Channel holding the reaction roles message
+    'roles_message_id': int,  # Reaction roles message linked in the greeting
+    'muted_channel_id': int,  # Where automute notices go
+    'muted_role_id': int,
+    'moderator_role_id': int,
+    'admin_category_id': int,  # Channels in this category are ignored by the anti-raid checks
+}
+
+# Environment variables the settings used to come from, seeded into the GUILD_ID guild on first load
+ENV_DEFAULTS = {
+    'level_channel_id': 'BOT_CID',
+    'log_channel_id': 'CHNL_ID',
+    'welcome_channel_id': 'INVMSG_CHANNEL_ID',
+    'muted_channel_id': 'MUTED_CHANNEL_ID',
+    'muted_role_id': 'MUTED_ROLE_ID',
+    'moderator_role_id': 'MODERATOR_ROLE_ID',
+}
+
+# IDs that used to be hardcoded, seeded into the GUILD_ID guild alongside the environment ones
+LEGACY_DEFAULTS = {
+    'roles_channel_id': '958385865372098610',
+    'roles_message_id': '958427189915820042',
+    'admin_category_id': '958386788085407794',
+}
+
+SEEDED_MARKER = '_seeded'  # Row recording that the GUILD_ID guild was seeded, so defaults are never restored
+
+ID_REGEX = re.compile(r"<(?:#|@&|@!?)(\d+)>|(\d+)")
+
+
+def parse_value(key: str, raw: str):
+    """Parse a raw setting into its type, accepting channel and role mentions for IDs. Raises ValueError."""
+    if key not in SETTINGS:
+        raise ValueError(f"Unknown setting `{key}`")
+    if SETTINGS[key] is int:
+        match = ID_REGEX.fullmatch(raw.strip())
+        if not match:
+            raise ValueError(f"`{key}` must be an ID or a mention")
+        return int(match.group(1) or match.group(2))
+    return SETTINGS[key](raw)
+
+
+class SettingsStore:
+    """
+    Per-guild settings stored in the guild_settings table and served from an immutable in-memory snapshot.
+    Lookups never touch the database or environment, and changes swap in a whole new snapshot at once.
+    """
+
+    def __init__(self):
+        self.snapshot = MappingProxyType({})  # guild_id -> read-only {key: value}
+
+    def get(self, guild_id: int, key: str, default=None):
+        guild_settings = self.snapshot.get(guild_id)
+        if guild_settings is None:
+            return default
+        return guild_settings.get(key, default)
+
+    def for_guild(self, guild_id: int):
+        return self.snapshot.get(guild_id, MappingProxyType({}))
+
+    async def load(self):
+        """Read every stored setting and swap in a fresh snapshot."""
+        guilds = {}
+        async with SessionLocal() as session:
+            result = await session.execute(select(GuildSetting))
+            for setting in result.scalars():
+                if setting.key == SEEDED_MARKER:
+                    continue
+                try:
+                    guilds.setdefault(setting.guild_id, {})[setting.key] = parse_value(setting.key, setting.value)
+                except ValueError as e:
+                    print(f"Ignoring setting {setting.key} for guild {setting.guild_id}: {e}")
+        self.snapshot = MappingProxyType({guild_id: MappingProxyType(values) for guild_id, values in guilds.items()})
+
+    async def seed_defaults(self):
+        """
+        Copy the old environment and hardcoded IDs into the GUILD_ID guild, once.
+        A marker row records the seeding, so settings an admin later unsets stay unset.
+        """
+        guild_id = os.getenv("GUILD_ID")
+        if not guild_id:
+            return
+        guild_id = int(guild_id)
+        async with SessionLocal() as session:
+            result = await session.execute(select(GuildSetting).filter(GuildSetting.guild_id == guild_id))
+            existing = {setting.key for setting in result.scalars()}
+            if SEEDED_MARKER in existing:
+                return
+            # A guild configured before the marker existed was already seeded
+            if not existing:
+                defaults = dict(LEGACY_DEFAULTS)
+                defaults.update({key: os.getenv(env) for key, env in ENV_DEFAULTS.items() if os.getenv(env)})
+                for key, value in defaults.items():
+                    session.add(GuildSetting(guild_id=guild_id, key=key, value=value))
+            session.add(GuildSetting(guild_id=guild_id, key=SEEDED_MARKER, value='1'))
+            await session.commit()
+
+    def _replace_guild(self, guild_id: int, values: dict):
+        guilds = dict(self.snapshot)
+        guilds[guild_id] = MappingProxyType(values)
+        self.snapshot = MappingProxyType(guilds)
+
+    async def set(self, guild_id: int, key: str, raw: str):
+        """Validate and store a setting, then swap in a snapshot containing it. Returns the parsed value."""
+        value = parse_value(key, raw)
+        async with SessionLocal() as session:
+            await session.execute(
+                insert(GuildSetting)
+                .values(guild_id=guild_id, key=key, value=str(value))
+                .on_conflict_do_update(
+                    index_elements=[GuildSetting.guild_id, GuildSetting.key],
+                    set_={'value': str(value)}
+                )
+            )
+            await session.commit()
+        self._replace_guild(guild_id, {**self.for_guild(guild_id), key: value})
+        return value
+
+    async def unset(self, guild_id: int, key: str):
+        """Remove a setting, then swap in a snapshot without it."""
+        async with SessionLocal() as session:
+            await session.execute(
+                delete(GuildSetting).filter(GuildSetting.guild_id == guild_id, GuildSetting.key == key)
+            )
+            await session.commit()
+        values = dict(self.for_guild(guild_id))
+        values.pop(key, None)
+        self._replace_guild(guild_id, values)